@@ -0,0 +1,172 @@
+from fastapi import Request, Response
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.backends.redis import RedisBackend
+from redis import asyncio as aioredis
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Any, Callable, Optional
+import logging
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Adres Redis - bez niego cache trzymany jest w pamieci procesu (wystarczajace dla jednego workera)
+REDIS_URL = os.getenv("REDIS_URL")
+
+CACHE_PREFIX = "stockguard"
+
+# Czas zycia wpisu w cache (sekundy) dla endpointow odczytu
+CACHE_EXPIRE = 60
+
+# Klucz Redis z numerem generacji cache - jego zwiekszenie uniewaznia wszystkie wpisy
+GENERATION_KEY = f"{CACHE_PREFIX}:generation"
+
+# Klient Redis (gdy ustawiono REDIS_URL) - uzywany do generacji cache i zamykany przy wylaczeniu
+_redis: Optional[aioredis.Redis] = None
+
+
+async def _cache_generation() -> str:
+    """
+    Zwraca aktualny numer generacji cache.
+
+    Dla cache w pamieci procesu generacja jest stala (uniewaznianie czysci wpisy).
+    Blad Redis daje unikalna generacje, wiec odczyt omija cache zamiast
+    zwracac potencjalnie nieaktualny wpis.
+
+    Returns:
+        str: Numer generacji do wlaczenia w klucz cache.
+    """
+    if _redis is None:
+        return "0"
+    try:
+        return str(int(await _redis.get(GENERATION_KEY) or 0))
+    except Exception:
+        logger.warning("Nie udalo sie odczytac generacji cache", exc_info=True)
+        return f"unavailable-{time.monotonic_ns()}"
+
+
+async def endpoint_key_builder(
+    func: Callable[..., Any],
+    namespace: str = "",
+    *,
+    request: Optional[Request] = None,
+    response: Optional[Response] = None,
+    args: tuple,
+    kwargs: dict,
+) -> str:
+    """
+    Buduje klucz cache z generacji cache, nazwy endpointu i jego parametrow.
+
+    Sesja bazy danych (db) jest pomijana, poniewaz jest inna dla kazdego zadania.
+
+    Args:
+        func: Funkcja endpointu.
+        namespace: Przestrzen nazw klucza (prefiks cache).
+        request: Zadanie HTTP (nieuzywane).
+        response: Odpowiedz HTTP (nieuzywana).
+        args: Argumenty pozycyjne endpointu.
+        kwargs: Argumenty nazwane endpointu.
+
+    Returns:
+        str: Klucz cache, np. "stockguard::0:read_products:limit=100:skip=0".
+    """
+    params = ":".join(f"{key}={value}" for key, value in sorted(kwargs.items()) if key != "db")
+    return f"{namespace}:{await _cache_generation()}:{func.__name__}:{params}"
+
+
+def init_cache() -> None:
+    """
+    Inicjalizuje cache odpowiedzi (Redis gdy ustawiono REDIS_URL, w przeciwnym razie pamiec procesu).
+
+    Kolejne wywolania nie zmieniaja juz zainicjalizowanej konfiguracji.
+    """
+    global _redis
+    if REDIS_URL:
+        _redis = aioredis.from_url(REDIS_URL)
+        backend = RedisBackend(_redis)
+    else:
+        backend = InMemoryBackend()
+    FastAPICache.init(backend, prefix=CACHE_PREFIX, expire=CACHE_EXPIRE, key_builder=endpoint_key_builder)
+
+
+async def invalidate_cache() -> None:
+    """
+    Uniewaznia wszystkie wpisy cache aplikacji.
+
+    Wywolywane po kazdej operacji zapisu - produkty zawieraja dane kategorii,
+    wiec zmiana kategorii takze uniewaznia zapisane listy produktow.
+
+    W Redis zwiekszana jest generacja cache (INCR, O(1)) - stare wpisy przestaja
+    byc odczytywane i wygasaja po CACHE_EXPIRE sekundach, bez skanowania kluczy.
+    Cache w pamieci procesu jest czyszczony bezposrednio.
+    
+    Blad backendu cache (np. niedostepny Redis) jest tylko logowany - zapis w bazie
+    jest juz zatwierdzony, a wpisy wygasna po CACHE_EXPIRE sekundach.
+    """
+    try:
+        if _redis is not None:
+            await _redis.incr(GENERATION_KEY)
+        else:
+            await FastAPICache.clear()
+    except Exception:
+        logger.warning("Nie udalo sie uniewaznic cache odpowiedzi", exc_info=True)
+
+
+async def close_cache() -> None:
+    """
+    Zamyka polaczenie z Redis (jesli bylo uzywane) przy wylaczaniu aplikacji.
+    """
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
+
+
+class RevalidateCachedResponsesMiddleware:
+    """
+    Middleware ASGI ustawiajacy Cache-Control: no-cache dla odpowiedzi z cache.
+
+    fastapi-cache wysyla Cache-Control: max-age, przez co przegladarka moglaby
+    pokazywac nieaktualne dane mimo uniewaznienia cache po stronie serwera.
+    Z no-cache przegladarka zawsze pyta serwer (z If-None-Match, wiec
+    niezmieniona odpowiedz nadal konczy sie kodem 304).
+
+    Attributes:
+        app: Opakowywana aplikacja ASGI.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        """
+        Inicjalizuje middleware.
+
+        Args:
+            app: Opakowywana aplikacja ASGI.
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Obsluguje zadanie, podmieniajac naglowek Cache-Control odpowiedzi z cache.
+
+        Args:
+            scope: Zakres polaczenia ASGI.
+            receive: Funkcja odbierajaca komunikaty ASGI.
+            send: Funkcja wysylajaca komunikaty ASGI.
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if "x-fastapi-cache" in headers:
+                    headers["Cache-Control"] = "no-cache"
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,5 +1,7 @@
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from typing import AsyncGenerator
 import os
 from dotenv import load_dotenv
@@ -8,7 +10,33 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# Wymuszenie sterownika asyncpg dla PostgreSQL (binarny protokol i cache przygotowanych zapytan)
+_url = make_url(DATABASE_URL)
+if _url.get_backend_name() == "postgresql" and _url.get_driver_name() != "asyncpg":
+    DATABASE_URL = _url.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+# Logowanie zapytan SQL tylko w trybie debugowania (SQL_ECHO=1)
+SQL_ECHO = os.getenv("SQL_ECHO") == "1"
+
+# Automatyczne tworzenie tabel przy starcie aplikacji (STOCKGUARD_AUTO_CREATE=1).
+# Domyslnie wylaczone - schemat tworzy jednorazowo skrypt scripts/init_db.py
+AUTO_CREATE_TABLES = os.getenv("STOCKGUARD_AUTO_CREATE") == "1"
+
+# Pula polaczen - handlery wykorzystuja ponownie otwarte polaczenia zamiast laczyc sie z baza przy kazdym zadaniu
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=SQL_ECHO,
+    future=True,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=5,
+    max_overflow=10,
+    pool_timeout=30,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    # Cache przygotowanych zapytan asyncpg na polaczenie. Uwaga: PgBouncer musi dzialac
+    # w trybie session - tryb transaction nie obsluguje przygotowanych zapytan
+    connect_args={"prepared_statement_cache_size": 512},
+)
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -19,6 +47,15 @@ AsyncSessionLocal = async_sessionmaker(
 class Base(DeclarativeBase):
     pass
 
+async def create_tables() -> None:
+    """
+    Tworzy w bazie danych wszystkie tabele zarejestrowane w Base.metadata.
+
+    Modele musza byc zaimportowane przed wywolaniem, aby byly zarejestrowane.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Zaleznosc dostarczajaca asynchroniczna sesje bazy danych.
@@ -1,26 +1,90 @@
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import delete, exists, insert, update, lambda_stmt
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
-from contextlib import asynccontextmanager
+from sqlalchemy.orm import selectinload, raiseload
+from fastapi_cache.decorator import cache
+from contextlib import asynccontextmanager, suppress
+from cachetools import TTLCache
 import asyncio
 
-from app.database import engine, Base, get_db
+from app.database import AUTO_CREATE_TABLES, create_tables, get_db
 from app.models import Product, Category
 from app.schemas import (
     ProductCreate, ProductUpdate, ProductResponse,
     CategoryCreate, CategoryUpdate, CategoryResponse
 )
-from app.websockets import manager, broadcast_server_status
+from app.websockets import get_manager, broadcast_server_status
+from app.cache import RevalidateCachedResponsesMiddleware, close_cache, init_cache, invalidate_cache
+
+# Opcje ladowania produktu: kategoria ladowana z wyprzedzeniem, kazda inna relacja
+# zglasza blad zamiast niejawnego zapytania (lazy load) w kontekscie async
+PRODUCT_LOAD_OPTIONS = (selectinload(Product.category).raiseload("*"), raiseload("*"))
+
+# Cache ID istniejacych kategorii (w obrebie procesu) - walidacja klucza obcego produktu
+# bez zapytania do bazy. Uzupelniany przy odczycie/tworzeniu, czyszczony przy usuwaniu kategorii
+_category_ids: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+
+
+async def _category_exists(db: AsyncSession, category_id: int) -> bool:
+    """
+    Sprawdza czy kategoria o podanym ID istnieje, korzystajac najpierw z cache _category_ids.
+
+    Args:
+        db: Sesja bazy danych.
+        category_id: ID kategorii do sprawdzenia.
+
+    Returns:
+        bool: True jesli kategoria istnieje.
+    """
+    if category_id in _category_ids:
+        return True
+    result = await db.execute(select(Category.id).where(Category.id == category_id).limit(1))
+    if result.scalar_one_or_none() is None:
+        return False
+    _category_ids[category_id] = True
+    return True
+
+
+def _category_payload(category: Category) -> dict:
+    """
+    Buduje slownik z danymi kategorii do rozgloszenia przez WebSocket.
+
+    Args:
+        category: Kategoria z bazy danych.
+
+    Returns:
+        dict: Dane kategorii zgodne ze schematem CategoryResponse.
+    """
+    return CategoryResponse.model_validate(category).model_dump()
+
+
+def _product_payload(product: Product) -> dict:
+    """
+    Buduje slownik z danymi produktu (wraz z kategoria) do rozgloszenia przez WebSocket.
+
+    Args:
+        product: Produkt z bazy danych z zaladowana relacja kategorii.
+
+    Returns:
+        dict: Dane produktu zgodne ze schematem ProductResponse.
+    """
+    return ProductResponse.model_validate(product).model_dump()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Menedzer kontekstu cyklu zycia aplikacji obslugujacy zdarzenia startu i zamkniecia.
 
-    Uruchamia zadanie w tle do rozglaszania statusu serwera oraz inicjalizuje tabele bazy danych.
-    Po zamknieciu aplikacji anuluje zadania w tle.
+    Inicjalizuje cache odpowiedzi i uruchamia zadanie w tle do rozglaszania
+    statusu serwera. Tabele bazy danych
+    sa tworzone tylko gdy ustawiono STOCKGUARD_AUTO_CREATE=1 (w przeciwnym razie
+    schemat inicjalizuje skrypt scripts/init_db.py).
+    Po zamknieciu aplikacji zadanie w tle jest anulowane, a lifespan czeka
+    na jego faktyczne zakonczenie; nastepnie zamykane jest polaczenie z Redis.
 
     Args:
         app: Instancja aplikacji FastAPI.
@@ -28,16 +92,21 @@ async def lifespan(app: FastAPI):
     Yields:
         None: Przekazuje kontrole do aplikacji podczas jej dzialania.
     """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if AUTO_CREATE_TABLES:
+        await create_tables()
+
+    init_cache()
     
     task = asyncio.create_task(broadcast_server_status())
-    
+
     yield
 
     task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+    await close_cache()
 
-app = FastAPI(lifespan=lifespan, title="StockGuard API")
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse, title="StockGuard API")
 
 #Cors
 app.add_middleware(
@@ -48,7 +117,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Odpowiedzi z cache zawsze rewalidowane przez przegladarke (ETag), bez max-age
+app.add_middleware(RevalidateCachedResponsesMiddleware)
+
 #endpointy
+#Endpointy odczytu zwracaja gotowe modele Pydantic (response_model=None), wiec FastAPI
+#nie waliduje ich ponownie - schemat odpowiedzi w dokumentacji opisuje parametr responses
 
 #ENDPOINTY KATEGORII
 
@@ -68,29 +142,27 @@ async def create_category(category: CategoryCreate, db: AsyncSession = Depends(g
         HTTPException: Gdy kategoria o podanej nazwie juz istnieje (400).
     """
     # Sprawdzenie czy kategoria o takiej nazwie juz istnieje
-    result = await db.execute(select(Category).filter(Category.name == category.name))
-    existing = result.scalar_one_or_none()
-    if existing:
+    result = await db.execute(select(exists().where(Category.name == category.name)))
+    if result.scalar():
         raise HTTPException(status_code=400, detail="Category with this name already exists")
     
-    new_category = Category(**category.model_dump())
-    db.add(new_category)
+    # INSERT ... RETURNING - utworzona kategoria wraca w tym samym zapytaniu (bez dodatkowego SELECT)
+    result = await db.scalars(insert(Category).returning(Category), [category.model_dump()])
+    new_category = result.one()
     await db.commit()
-    await db.refresh(new_category)
+    await invalidate_cache()
+    _category_ids[new_category.id] = True
 
-    await manager.broadcast({
+    await get_manager().broadcast({
         "type": "category_created",
-        "category": {
-            "id": new_category.id,
-            "name": new_category.name,
-            "description": new_category.description
-        }
+        "category": _category_payload(new_category)
     })
 
     return new_category
 
 
-@app.get("/categories/", response_model=list[CategoryResponse])
+@app.get("/categories/", response_model=None, responses={200: {"model": list[CategoryResponse]}})
+@cache()
 async def read_categories(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)) -> list[CategoryResponse]:
     """
     Pobiera liste kategorii z paginacja.
@@ -103,12 +175,16 @@ async def read_categories(skip: int = 0, limit: int = 100, db: AsyncSession = De
     Returns:
         list[CategoryResponse]: Lista kategorii.
     """
-    result = await db.execute(select(Category).offset(skip).limit(limit))
+    # lambda_stmt - skompilowany SQL jest cache'owany, skip/limit trafiaja jako parametry
+    stmt = lambda_stmt(lambda: select(Category))
+    stmt += lambda s: s.offset(skip).limit(limit)
+    result = await db.execute(stmt)
     categories = result.scalars().all()
-    return categories
+    return [CategoryResponse.model_validate(c) for c in categories]
 
 
-@app.get("/categories/{category_id}", response_model=CategoryResponse)
+@app.get("/categories/{category_id}", response_model=None, responses={200: {"model": CategoryResponse}})
+@cache()
 async def read_category(category_id: int, db: AsyncSession = Depends(get_db)) -> CategoryResponse:
     """
     Pobiera konkretna kategorie po ID.
@@ -123,11 +199,10 @@ async def read_category(category_id: int, db: AsyncSession = Depends(get_db)) ->
     Raises:
         HTTPException: Gdy kategoria o podanym ID nie istnieje (404).
     """
-    result = await db.execute(select(Category).filter(Category.id == category_id))
-    category = result.scalar_one_or_none()
+    category = await db.get(Category, category_id)
     if category is None:
         raise HTTPException(status_code=404, detail="Category not found")
-    return category
+    return CategoryResponse.model_validate(category)
 
 
 @app.put("/categories/{category_id}", response_model=CategoryResponse)
@@ -147,8 +222,7 @@ async def update_category(category_id: int, category_update: CategoryUpdate, db:
         HTTPException: Gdy kategoria o podanym ID nie istnieje (404).
         HTTPException: Gdy kategoria o nowej nazwie juz istnieje (400).
     """
-    result = await db.execute(select(Category).filter(Category.id == category_id))
-    db_category = result.scalar_one_or_none()
+    db_category = await db.get(Category, category_id)
     
     if db_category is None:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -157,23 +231,20 @@ async def update_category(category_id: int, category_update: CategoryUpdate, db:
     
     # Sprawdzenie unikalnosci nazwy jesli jest aktualizowana
     if "name" in update_data and update_data["name"] != db_category.name:
-        existing = await db.execute(select(Category).filter(Category.name == update_data["name"]))
-        if existing.scalar_one_or_none():
+        existing = await db.execute(select(exists().where(Category.name == update_data["name"])))
+        if existing.scalar():
             raise HTTPException(status_code=400, detail="Category with this name already exists")
     
     for key, value in update_data.items():
         setattr(db_category, key, value)
 
     await db.commit()
+    await invalidate_cache()
     await db.refresh(db_category)
 
-    await manager.broadcast({
+    await get_manager().broadcast({
         "type": "category_updated",
-        "category": {
-            "id": db_category.id,
-            "name": db_category.name,
-            "description": db_category.description
-        }
+        "category": _category_payload(db_category)
     })
 
     return db_category
@@ -185,6 +256,8 @@ async def delete_category(category_id: int, db: AsyncSession = Depends(get_db))
     Usuwa kategorie po ID.
     
     Przed usunieciem ustawia category_id na None dla wszystkich produktow w tej kategorii.
+    Oba kroki to pojedyncze zapytania UPDATE i DELETE ... RETURNING - bez ladowania
+    kategorii ani jej produktow do sesji.
     
     Args:
         category_id: ID kategorii do usuniecia.
@@ -196,23 +269,24 @@ async def delete_category(category_id: int, db: AsyncSession = Depends(get_db))
     Raises:
         HTTPException: Gdy kategoria o podanym ID nie istnieje (404).
     """
-    result = await db.execute(select(Category).filter(Category.id == category_id))
-    db_category = result.scalar_one_or_none()
-    
-    if db_category is None:
+    # Usuniecie przypisania kategorii z produktow jednym zapytaniem UPDATE
+    await db.execute(
+        update(Product).where(Product.category_id == category_id).values(category_id=None)
+    )
+
+    # Usuniecie kategorii bez relationship cascade (ktora ladowalaby Category.products)
+    category_id_copy = await db.scalar(
+        delete(Category).where(Category.id == category_id).returning(Category.id)
+    )
+
+    if category_id_copy is None:
         raise HTTPException(status_code=404, detail="Category not found")
-    
-    # Usuniecie przypisania kategorii z produktow
-    products_result = await db.execute(select(Product).filter(Product.category_id == category_id))
-    products = products_result.scalars().all()
-    for product in products:
-        product.category_id = None
-    
-    category_id_copy = db_category.id
-    await db.delete(db_category)
+
     await db.commit()
+    await invalidate_cache()
+    _category_ids.pop(category_id_copy, None)
 
-    await manager.broadcast({
+    await get_manager().broadcast({
         "type": "category_deleted",
         "category_id": category_id_copy
     })
@@ -238,39 +312,34 @@ async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_
         HTTPException: Gdy podana kategoria nie istnieje (404).
     """
     # Sprawdzenie czy kategoria istnieje (jesli podana)
-    if product.category_id:
-        cat_result = await db.execute(select(Category).filter(Category.id == product.category_id))
-        if cat_result.scalar_one_or_none() is None:
-            raise HTTPException(status_code=404, detail="Category not found")
-    
-    new_product = Product(**product.model_dump())
-    db.add(new_product)
-    await db.commit()
+    if product.category_id and not await _category_exists(db, product.category_id):
+        raise HTTPException(status_code=404, detail="Category not found")
     
-    # Pobranie produktu z zaladowana relacja kategorii
-    result = await db.execute(
-        select(Product).options(selectinload(Product.category)).filter(Product.id == new_product.id)
-    )
-    new_product = result.scalar_one()
+    # INSERT ... RETURNING - utworzony produkt wraca w tym samym zapytaniu, kategoria ladowana przez selectinload
+    try:
+        result = await db.scalars(
+            insert(Product).returning(Product).options(*PRODUCT_LOAD_OPTIONS),
+            [product.model_dump()]
+        )
+        new_product = result.one()
+        await db.commit()
+    except IntegrityError:
+        # Kategoria usunieta w innym procesie - nieaktualny wpis w cache _category_ids
+        await db.rollback()
+        _category_ids.pop(product.category_id, None)
+        raise HTTPException(status_code=404, detail="Category not found")
+    await invalidate_cache()
 
-    await manager.broadcast({
+    await get_manager().broadcast({
         "type": "product_created",
-        "product": {
-            "id": new_product.id,
-            "name": new_product.name,
-            "description": new_product.description,
-            "price": new_product.price,
-            "quantity": new_product.quantity,
-            "low_stock_threshold": new_product.low_stock_threshold,
-            "category_id": new_product.category_id,
-            "category": {"id": new_product.category.id, "name": new_product.category.name, "description": new_product.category.description} if new_product.category else None
-        }
+        "product": _product_payload(new_product)
     })
 
     return new_product
 
 
-@app.get("/products/", response_model=list[ProductResponse])
+@app.get("/products/", response_model=None, responses={200: {"model": list[ProductResponse]}})
+@cache()
 async def read_products(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)) -> list[ProductResponse]:
     """
     Pobiera liste produktow z paginacja.
@@ -283,14 +352,16 @@ async def read_products(skip: int = 0, limit: int = 100, db: AsyncSession = Depe
     Returns:
         list[ProductResponse]: Lista produktow z danymi kategorii.
     """
-    result = await db.execute(
-        select(Product).options(selectinload(Product.category)).offset(skip).limit(limit)
-    )
+    # lambda_stmt - skompilowany SQL jest cache'owany, skip/limit trafiaja jako parametry
+    stmt = lambda_stmt(lambda: select(Product).options(*PRODUCT_LOAD_OPTIONS))
+    stmt += lambda s: s.offset(skip).limit(limit)
+    result = await db.execute(stmt)
     products = result.scalars().all()
-    return products
+    return [ProductResponse.model_validate(p) for p in products]
 
 
-@app.get("/products/{product_id}", response_model=ProductResponse)
+@app.get("/products/{product_id}", response_model=None, responses={200: {"model": ProductResponse}})
+@cache()
 async def read_product(product_id: int, db: AsyncSession = Depends(get_db)) -> ProductResponse:
     """
     Pobiera konkretny produkt po ID.
@@ -305,13 +376,10 @@ async def read_product(product_id: int, db: AsyncSession = Depends(get_db)) -> P
     Raises:
         HTTPException: Gdy produkt o podanym ID nie istnieje (404).
     """
-    result = await db.execute(
-        select(Product).options(selectinload(Product.category)).filter(Product.id == product_id)
-    )
-    product = result.scalar_one_or_none()
+    product = await db.get(Product, product_id, options=PRODUCT_LOAD_OPTIONS)
     if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return ProductResponse.model_validate(product)
 
 
 @app.put("/products/{product_id}", response_model=ProductResponse)
@@ -331,10 +399,7 @@ async def update_product(product_id: int, product_update: ProductUpdate, db: Asy
         HTTPException: Gdy produkt o podanym ID nie istnieje (404).
         HTTPException: Gdy podana kategoria nie istnieje (404).
     """
-    result = await db.execute(
-        select(Product).options(selectinload(Product.category)).filter(Product.id == product_id)
-    )
-    db_product = result.scalar_one_or_none()
+    db_product = await db.get(Product, product_id, options=PRODUCT_LOAD_OPTIONS)
     
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -342,48 +407,43 @@ async def update_product(product_id: int, product_update: ProductUpdate, db: Asy
     update_data = product_update.model_dump(exclude_unset=True)
     
     # Sprawdzenie czy kategoria istnieje (jesli aktualizowana)
-    if "category_id" in update_data and update_data["category_id"] is not None:
-        cat_result = await db.execute(select(Category).filter(Category.id == update_data["category_id"]))
-        if cat_result.scalar_one_or_none() is None:
-            raise HTTPException(status_code=404, detail="Category not found")
+    new_category_id = update_data.get("category_id")
+    if new_category_id is not None and not await _category_exists(db, new_category_id):
+        raise HTTPException(status_code=404, detail="Category not found")
     
     for key, value in update_data.items():
         setattr(db_product, key, value)
 
-    await db.commit()
-    
-    # Wyczyszczenie cache i pobranie zaktualizowanego produktu z zaladowana relacja kategorii
-    await db.refresh(db_product)
-    db.expire(db_product)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Kategoria usunieta w innym procesie - nieaktualny wpis w cache _category_ids
+        await db.rollback()
+        _category_ids.pop(new_category_id, None)
+        raise HTTPException(status_code=404, detail="Category not found")
+    await invalidate_cache()
     
-    result = await db.execute(
-        select(Product).options(selectinload(Product.category)).filter(Product.id == product_id)
-    )
-    db_product = result.scalar_one()
+    # Relacja kategorii jest juz zaladowana - odswiezamy ja tylko gdy zmienil sie category_id
+    if "category_id" in update_data:
+        await db.refresh(db_product, attribute_names=["category"])
 
     # Rozgloszenie aktualizacji
-    await manager.broadcast({
+    messages = [{
         "type": "product_updated",
-        "product": {
-            "id": db_product.id,
-            "name": db_product.name,
-            "description": db_product.description,
-            "price": db_product.price,
-            "quantity": db_product.quantity,
-            "low_stock_threshold": db_product.low_stock_threshold,
-            "category_id": db_product.category_id,
-            "category": {"id": db_product.category.id, "name": db_product.category.name, "description": db_product.category.description} if db_product.category else None
-        }
-    })
+        "product": _product_payload(db_product)
+    }]
 
     # Sprawdzenie alertu niskiego stanu magazynowego
     if db_product.quantity < db_product.low_stock_threshold:
-        await manager.broadcast({
+        messages.append({
             "type": "alert",
             "product": db_product.name,
             "message": f"Niski stan magazynowy produktu: {db_product.name} (Ilość: {db_product.quantity})"
         })
 
+    # Aktualizacja i ewentualny alert wysylane w jednej ramce WebSocket
+    await get_manager().broadcast_many(messages)
+
     return db_product
 
 @app.delete("/products/{product_id}")
@@ -401,8 +461,7 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)) ->
     Raises:
         HTTPException: Gdy produkt o podanym ID nie istnieje (404).
     """
-    result = await db.execute(select(Product).filter(Product.id == product_id))
-    db_product = result.scalar_one_or_none()
+    db_product = await db.get(Product, product_id)
     
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -410,8 +469,9 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)) ->
     product_id_copy = db_product.id
     await db.delete(db_product)
     await db.commit()
+    await invalidate_cache()
 
-    await manager.broadcast({
+    await get_manager().broadcast({
         "type": "product_deleted",
         "product_id": product_id_copy
     })
@@ -424,7 +484,7 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
     Endpoint WebSocket do komunikacji w czasie rzeczywistym.
     
     Obsluguje polaczenia WebSocket dla aktualizacji w czasie rzeczywistym, w tym:
-    - Rozglaszanie statusu serwera co 5 sekund (z uzyciem blokad do synchronizacji)
+    - Rozglaszanie statusu serwera co 5 sekund
     - Powiadomienia o operacjach CRUD na produktach i kategoriach
     - Alerty niskiego stanu magazynowego
     - Informacje o liczbie podlaczonych klientow
@@ -432,9 +492,11 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
     Args:
         websocket: Instancja polaczenia WebSocket.
     """
-    await manager.connect(websocket)
+    await get_manager().connect(websocket)
     try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        await manager.disconnect(websocket)
+        # Endpoint tylko rozglasza - surowe receive() bez dekodowania tresci i bez wyjatku
+        # WebSocketDisconnect; petla konczy sie na komunikacie zamkniecia polaczenia
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        await get_manager().disconnect(websocket)
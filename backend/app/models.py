@@ -16,7 +16,7 @@ class Category(Base):
     __tablename__ = "categories"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, unique=True)
+    name = Column(String(255), index=True, unique=True)
     description = Column(String, nullable=True)
     
     products = relationship("Product", back_populates="category")
@@ -39,11 +39,11 @@ class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True)
+    name = Column(String(255), index=True)
     description = Column(String, nullable=True)
     price = Column(Float)
     quantity = Column(Integer)
     low_stock_threshold = Column(Integer, default=5)
-    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True, index=True)
     
     category = relationship("Category", back_populates="products")
@@ -1,6 +1,15 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 
+# Maksymalna dlugosc nazwy (zgodna z kolumnami String(255)) i pozostalych pol tekstowych
+NAME_MAX_LENGTH = 255
+TEXT_MAX_LENGTH = 1024
+
+# Wspolna konfiguracja schematow wejsciowych (Create/Update): usuwanie bialych znakow
+# i limit dlugosci tekstu sprawdzane juz podczas parsowania, zanim dane trafia do bazy.
+# Schematy odpowiedzi nie maja tych ograniczen - musza serializowac istniejace wiersze
+STR_CONFIG = ConfigDict(str_strip_whitespace=True, str_max_length=TEXT_MAX_LENGTH)
+
 
 # --- Schematy Kategorii ---
 
@@ -19,9 +28,11 @@ class CategoryBase(BaseModel):
 class CategoryCreate(CategoryBase):
     """
     Schemat do tworzenia nowej kategorii.
-    Dziedziczy wszystkie pola z CategoryBase.
+    Dziedziczy wszystkie pola z CategoryBase, dodajac walidacje dlugosci nazwy i tekstu.
     """
-    pass
+    name: str = Field(..., min_length=1, max_length=NAME_MAX_LENGTH)
+
+    model_config = STR_CONFIG
 
 
 class CategoryUpdate(BaseModel):
@@ -32,9 +43,11 @@ class CategoryUpdate(BaseModel):
         name: Nowa nazwa kategorii.
         description: Nowy opis kategorii.
     """
-    name: Optional[str] = None
+    name: Optional[str] = Field(None, min_length=1, max_length=NAME_MAX_LENGTH)
     description: Optional[str] = None
 
+    model_config = STR_CONFIG
+
 
 class CategoryResponse(CategoryBase):
     """
@@ -73,9 +86,11 @@ class ProductBase(BaseModel):
 class ProductCreate(ProductBase):
     """
     Schemat do tworzenia nowego produktu.
-    Dziedziczy wszystkie pola z ProductBase.
+    Dziedziczy wszystkie pola z ProductBase, dodajac walidacje dlugosci nazwy i tekstu.
     """
-    pass
+    name: str = Field(..., min_length=1, max_length=NAME_MAX_LENGTH)
+
+    model_config = STR_CONFIG
 
 
 class ProductUpdate(BaseModel):
@@ -90,13 +105,15 @@ class ProductUpdate(BaseModel):
         low_stock_threshold: Nowy prog niskiego stanu magazynowego.
         category_id: Nowy identyfikator kategorii produktu.
     """
-    name: Optional[str] = None
+    name: Optional[str] = Field(None, min_length=1, max_length=NAME_MAX_LENGTH)
     description: Optional[str] = None
     price: Optional[float] = None
     quantity: Optional[int] = None
     low_stock_threshold: Optional[int] = None
     category_id: Optional[int] = None
 
+    model_config = STR_CONFIG
+
 
 class ProductResponse(ProductBase):
     """
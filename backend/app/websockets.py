@@ -1,182 +1,433 @@
 from fastapi import WebSocket
-from typing import List
-import json
+from starlette.websockets import WebSocketState
+from typing import Dict, List, Set, Union
 import asyncio
+import functools
+import time
 from datetime import datetime
+import orjson
+
+
+# Maksymalna liczba wiadomosci laczonych w jedna ramke WebSocket
+MAX_FRAME_MESSAGES = 64
+
+# Jak dlugo (w sekundach) writer czeka na kolejne wiadomosci przed wysylka ramki
+FRAME_BATCH_WINDOW = 0.005
+
+# Od tej liczby oczekujacych wiadomosci klient nie otrzymuje nowych statusow (wiadomosci do pominiecia)
+CLIENT_QUEUE_SIZE = 128
+
+# Maksymalna liczba oczekujacych wiadomosci klienta - po jej przekroczeniu klient jest rozlaczany
+CLIENT_QUEUE_MAX_SIZE = 1024
+
+# Czas (w sekundach) na zamkniecie polaczenia klienta, ktory nie nadaza z odbiorem
+CLOSE_TIMEOUT = 1.0
+
+# Powyzej tej liczby klientow serializacja wiadomosci odbywa sie w puli watkow
+SERIALIZE_OFFLOAD_CONNECTIONS = 200
+
+# Jak dlugo (w sekundach) sformatowany znacznik czasu moze byc uzywany ponownie
+TIMESTAMP_CACHE_SECONDS = 0.5
+
+# Odstep (w sekundach) pomiedzy kolejnymi sprawdzeniami statusu
+STATUS_INTERVAL_SECONDS = 5.0
+
+# Po ilu zaleglych tickach harmonogram jest wyrownywany do biezacego czasu
+MAX_TICKS_BEHIND = 3
+
+# Co ile sekund status jest wysylany nawet bez zmian (keepalive)
+STATUS_KEEPALIVE_SECONDS = 30
 
 
 class ServerStatus:
     """
-    Klasa reprezentujaca status serwera z mechanizmem synchronizacji dostepu.
+    Klasa reprezentujaca status serwera.
     
-    Wykorzystuje asyncio.Lock do zapewnienia bezpiecznego dostepu do wspoldzielonych
-    zasobow w srodowisku wielowatkowym/asynchronicznym.
+    Nie wymaga blokady: wszystkie metody sa synchroniczne i nie zawieraja await,
+    wiec w petli zdarzen asyncio wykonuja sie w calosci, bez przeplotu z innymi
+    korutynami - odczyty i zapisy pol sa atomowe wzgledem pozostalego kodu.
     
     Attributes:
-        _lock: Blokada asyncio do synchronizacji dostepu.
         _status: Aktualny status serwera (np. "Online", "Offline").
         _timestamp: Znacznik czasu ostatniej aktualizacji statusu.
         _connected_clients: Liczba podlaczonych klientow WebSocket.
+        _ts_cache: Ostatnio sformatowany znacznik czasu ISO.
+        _ts_cache_epoch: Czas (time.time()) sformatowania _ts_cache.
+        _msg: Przygotowana raz wiadomosc statusu, aktualizowana w miejscu razem z polami.
     """
     
     def __init__(self) -> None:
         """
-        Inicjalizuje obiekt ServerStatus z domyslnymi wartosciami i blokada.
+        Inicjalizuje obiekt ServerStatus z domyslnymi wartosciami.
         """
-        self._lock = asyncio.Lock()
+        self._ts_cache_epoch: float = 0.0
+        self._ts_cache: str = ""
         self._status: str = "Online"
-        self._timestamp: str = datetime.now().isoformat()
+        self._timestamp: str = self._iso_now()
         self._connected_clients: int = 0
+        self._msg: dict = {
+            "type": "status",
+            "status": self._status,
+            "timestamp": self._timestamp,
+            "connected_clients": 0
+        }
+
+    def _iso_now(self) -> str:
+        """
+        Zwraca aktualny znacznik czasu ISO, formatowany najwyzej raz na TIMESTAMP_CACHE_SECONDS.
+
+        Ogranicza tworzenie obiektow datetime i formatowanie napisow przy seriach
+        polaczen/rozlaczen klientow.
+
+        Returns:
+            str: Znacznik czasu w formacie ISO 8601.
+        """
+        t = time.time()
+        if t - self._ts_cache_epoch >= TIMESTAMP_CACHE_SECONDS:
+            self._ts_cache = datetime.fromtimestamp(t).isoformat()
+            self._ts_cache_epoch = t
+        return self._ts_cache
     
-    async def get_status(self) -> dict:
+    def get_status(self) -> dict:
         """
-        Pobiera aktualny status serwera w sposob bezpieczny dla watkow.
+        Pobiera aktualny status serwera.
         
-        Uzywa blokady asyncio.Lock aby zapewnic atomowy odczyt wszystkich pol statusu.
+        Zwraca plytka kopie przygotowanej wiadomosci - wywolujacy moze ja
+        modyfikowac (np. znacznik czasu wysylki) bez zmiany stanu serwera.
         
         Returns:
             dict: Slownik zawierajacy status, timestamp i liczbe podlaczonych klientow.
         """
-        async with self._lock:
-            return {
-                "type": "status",
-                "status": self._status,
-                "timestamp": self._timestamp,
-                "connected_clients": self._connected_clients
-            }
+        return self._msg.copy()
     
-    async def update_status(self, status: str) -> None:
+    def update_status(self, status: str) -> None:
         """
-        Aktualizuje status serwera w sposob bezpieczny dla watkow.
-        
-        Uzywa blokady asyncio.Lock aby zapewnic atomowa aktualizacje statusu i timestampa.
+        Aktualizuje status serwera i znacznik czasu.
         
         Args:
             status: Nowy status serwera do ustawienia.
         """
-        async with self._lock:
-            self._status = status
-            self._timestamp = datetime.now().isoformat()
+        self._status = status
+        self._timestamp = self._iso_now()
+        self._msg["status"] = status
+        self._msg["timestamp"] = self._timestamp
     
-    async def increment_clients(self) -> None:
+    def on_client_delta(self, delta: int) -> None:
         """
-        Zwieksza licznik podlaczonych klientow w sposob bezpieczny dla watkow.
+        Zmienia licznik podlaczonych klientow i odswieza znacznik czasu w jednym kroku.
         
-        Uzywa blokady asyncio.Lock aby zapewnic atomowa inkrementacje licznika.
-        """
-        async with self._lock:
-            self._connected_clients += 1
-            self._timestamp = datetime.now().isoformat()
-    
-    async def decrement_clients(self) -> None:
-        """
-        Zmniejsza licznik podlaczonych klientow w sposob bezpieczny dla watkow.
-        
-        Uzywa blokady asyncio.Lock aby zapewnic atomowa dekrementacje licznika.
         Licznik nie spadnie ponizej 0.
+        
+        Args:
+            delta: Zmiana liczby klientow (1 przy podlaczeniu, -1 przy rozlaczeniu).
         """
-        async with self._lock:
-            self._connected_clients = max(0, self._connected_clients - 1)
-            self._timestamp = datetime.now().isoformat()
+        self._connected_clients = max(0, self._connected_clients + delta)
+        self._timestamp = self._iso_now()
+        self._msg["connected_clients"] = self._connected_clients
+        self._msg["timestamp"] = self._timestamp
     
-    async def refresh_timestamp(self) -> None:
+    def refresh_timestamp(self) -> None:
         """
         Odswieza znacznik czasu statusu bez zmiany innych wartosci.
-        
-        Uzywa blokady asyncio.Lock aby zapewnic atomowa aktualizacje timestampa.
         """
-        async with self._lock:
-            self._timestamp = datetime.now().isoformat()
+        self._timestamp = self._iso_now()
+        self._msg["timestamp"] = self._timestamp
 
 
-# Globalna instancja statusu serwera z mechanizmem blokad
-server_status = ServerStatus()
+@functools.lru_cache(maxsize=1)
+def get_server_status() -> ServerStatus:
+    """
+    Zwraca globalna instancje statusu serwera, tworzona przy pierwszym uzyciu.
+    
+    Returns:
+        ServerStatus: Wspoldzielony status serwera.
+    """
+    return ServerStatus()
 
 
 class ConnectionManager:
     """
     Zarzadza aktywnymi polaczeniami WebSocket i obsluguje rozglaszanie wiadomosci.
     
-    Wykorzystuje asyncio.Lock do synchronizacji dostepu do listy polaczen,
+    Wykorzystuje asyncio.Lock do synchronizacji dostepu do zbioru polaczen,
     zapewniajac bezpieczenstwo w srodowisku asynchronicznym.
     
+    Kazde polaczenie ma wlasna, ograniczona kolejke wiadomosci i zadanie piszace (writer),
+    ktore laczy oczekujace wiadomosci w jedna ramke WebSocket (tablica JSON).
+    Ograniczenie kolejki zapobiega nieograniczonemu wzrostowi pamieci przy wolnym kliencie.
+    
     Attributes:
-        active_connections: Lista aktualnie aktywnych polaczen WebSocket.
-        _lock: Blokada asyncio do synchronizacji dostepu do listy polaczen.
+        active_connections: Zbior aktualnie aktywnych polaczen WebSocket
+            (dodawanie i usuwanie w czasie O(1)).
+        _queues: Kolejki zserializowanych wiadomosci dla kazdego polaczenia.
+        _writers: Zadania wysylajace wiadomosci z kolejek do klientow.
+        _closing: Zadania w tle zamykajace polaczenia wolnych klientow.
+        _lock: Blokada asyncio do synchronizacji dostepu do zbioru polaczen.
     """
     def __init__(self) -> None:
         """
-        Inicjalizuje menedzera polaczen z pusta lista i blokada.
+        Inicjalizuje menedzera polaczen z pustym zbiorem i blokada.
         """
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Set[WebSocket] = set()
+        self._queues: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
+        self._closing: Set[asyncio.Task] = set()
         self._lock = asyncio.Lock()
 
     async def connect(self, websocket: WebSocket) -> None:
         """
-        Akceptuje nowe polaczenie WebSocket i dodaje je do listy w sposob bezpieczny.
+        Akceptuje nowe polaczenie WebSocket i dodaje je do zbioru w sposob bezpieczny.
         
         Uzywa blokady asyncio.Lock oraz aktualizuje globalny status serwera.
+        Uruchamia zadanie piszace dla nowego polaczenia i od razu kolejkuje
+        dla niego aktualny status (rozglaszanie pomija niezmieniony status).
         
         Args:
             websocket: Polaczenie WebSocket do zaakceptowania.
         """
         await websocket.accept()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE_MAX_SIZE)
         async with self._lock:
-            self.active_connections.append(websocket)
-        await server_status.increment_clients()
+            self.active_connections.add(websocket)
+            self._queues[websocket] = queue
+            self._writers[websocket] = asyncio.create_task(self._client_writer(websocket, queue))
+        server_status = get_server_status()
+        server_status.on_client_delta(1)
+
+        status_message = server_status.get_status()
+        status_message["timestamp"] = datetime.now().isoformat()
+        queue.put_nowait(orjson.dumps(status_message))
 
     async def disconnect(self, websocket: WebSocket) -> None:
         """
-        Usuwa polaczenie WebSocket z listy w sposob bezpieczny.
+        Usuwa polaczenie WebSocket ze zbioru w sposob bezpieczny.
         
         Uzywa blokady asyncio.Lock oraz aktualizuje globalny status serwera.
+        Zatrzymuje zadanie piszace polaczenia (chyba ze to ono wywoluje disconnect).
+        Ponowne wywolanie dla juz usunietego polaczenia nic nie zmienia
+        (polaczenie moze zostac usuniete zarowno przez writer, jak i endpoint).
         
         Args:
             websocket: Polaczenie WebSocket do usuniecia.
         """
         async with self._lock:
-            if websocket in self.active_connections:
-                self.active_connections.remove(websocket)
-        await server_status.decrement_clients()
+            if websocket not in self.active_connections:
+                return
+            self.active_connections.discard(websocket)
+            self._queues.pop(websocket, None)
+            writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+        get_server_status().on_client_delta(-1)
 
-    async def broadcast(self, message: dict) -> None:
+    async def _client_writer(self, websocket: WebSocket, queue: asyncio.Queue) -> None:
         """
-        Wysyla wiadomosc JSON do wszystkich aktywnych polaczen w sposob bezpieczny.
+        Wysyla wiadomosci z kolejki polaczenia, laczac je w ramki.
         
-        Uzywa blokady asyncio.Lock aby uzyskac kopie listy polaczen przed wysylka.
+        Po odebraniu pierwszej wiadomosci czeka do FRAME_BATCH_WINDOW na kolejne
+        i wysyla do MAX_FRAME_MESSAGES wiadomosci w jednej ramce: pojedyncza
+        wiadomosc jako obiekt JSON, kilka jako tablice JSON. Blad wysylki
+        (rozlaczony klient) usuwa polaczenie z menedzera.
         
         Args:
-            message: Slownik do wyslania jako JSON do wszystkich klientow.
+            websocket: Polaczenie WebSocket, do ktorego wysylane sa wiadomosci.
+            queue: Kolejka zserializowanych wiadomosci (bytes) dla polaczenia.
         """
-        async with self._lock:
-            connections = self.active_connections.copy()
+        try:
+            while True:
+                batch: List[bytes] = [await queue.get()]
+                self._drain(queue, batch)
+                if len(batch) < MAX_FRAME_MESSAGES:
+                    await asyncio.sleep(FRAME_BATCH_WINDOW)
+                    self._drain(queue, batch)
+
+                if websocket.application_state != WebSocketState.CONNECTED:
+                    break
+                payload = batch[0] if len(batch) == 1 else b"[" + b",".join(batch) + b"]"
+                # Komunikat ASGI wysylany bezposrednio - bez posrednictwa send_text/send_json
+                await websocket.send({"type": "websocket.send", "text": payload.decode()})
+        except Exception:
+            # Blad wysylki oznacza rozlaczonego klienta
+            pass
+        await self.disconnect(websocket)
+
+    @staticmethod
+    def _drain(queue: asyncio.Queue, batch: List[bytes]) -> None:
+        """
+        Przenosi oczekujace wiadomosci z kolejki do paczki (do MAX_FRAME_MESSAGES).
         
-        for connection in connections:
+        Args:
+            queue: Kolejka wiadomosci polaczenia.
+            batch: Paczka uzupelniana w miejscu.
+        """
+        while len(batch) < MAX_FRAME_MESSAGES:
             try:
-                await connection.send_json(message)
-            except Exception:
-                # Obsluga potencjalnych problemow z rozlaczeniem podczas rozglaszania
-                pass
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return
 
+    def _enqueue(self, payload: bytes, droppable: bool = False) -> List[WebSocket]:
+        """
+        Dodaje zserializowana wiadomosc do kolejek wszystkich polaczen.
+        
+        Metoda synchroniczna (bez await) - slownik kolejek nie zmienia sie w trakcie iteracji.
+        Wiadomosci do pominiecia (status) nie trafiaja do kolejek klientow zaleglych
+        o CLIENT_QUEUE_SIZE wiadomosci - kolejny status i tak zastapi poprzedni.
+        Pozostale wiadomosci (zmiany produktow, alerty) nie sa gubione; klient,
+        ktorego kolejka osiagnela CLIENT_QUEUE_MAX_SIZE, jest zwracany do rozlaczenia.
+        
+        Args:
+            payload: Wiadomosc JSON jako bytes.
+            droppable: Czy wiadomosc moze zostac pominieta dla wolnego klienta.
+        
+        Returns:
+            List[WebSocket]: Polaczenia, ktore nie nadazaja z odbiorem wiadomosci.
+        """
+        stuck: List[WebSocket] = []
+        for websocket, queue in self._queues.items():
+            if droppable and queue.qsize() >= CLIENT_QUEUE_SIZE:
+                continue
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                stuck.append(websocket)
+        return stuck
+
+    async def _drop_stuck(self, stuck: List[WebSocket]) -> None:
+        """
+        Rozlacza klientow, ktorzy nie nadazaja z odbiorem wiadomosci.
+        
+        Polaczenia sa od razu usuwane z menedzera, a ich zamkniecie odbywa sie
+        w zadaniach w tle - rozglaszanie (i obslugujacy je endpoint) nie czeka
+        na zablokowanych klientow.
+        
+        Args:
+            stuck: Polaczenia do rozlaczenia.
+        """
+        for websocket in stuck:
+            await self.disconnect(websocket)
+            task = asyncio.create_task(self._close_stuck(websocket))
+            # Referencja do zadania chroni je przed usunieciem przez garbage collector
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_stuck(websocket: WebSocket) -> None:
+        """
+        Zamyka polaczenie klienta, ktory nie nadaza z odbiorem wiadomosci.
+        
+        Zamkniecie jest ograniczone czasem CLOSE_TIMEOUT, poniewaz bufor wysylki
+        zablokowanego klienta moze byc pelny.
+        
+        Args:
+            websocket: Polaczenie do zamkniecia.
+        """
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), CLOSE_TIMEOUT)
+        except Exception:
+            pass
+
+    async def _encode(self, messages: List[dict]) -> List[bytes]:
+        """
+        Serializuje wiadomosci do JSON (orjson).
+        
+        Przy duzej liczbie klientow petla zdarzen jest mocno obciazona wysylka,
+        wiec serializacja jest przenoszona do puli watkow (asyncio.to_thread),
+        aby nie opozniac obslugi zadan HTTP. Przy malej liczbie klientow
+        serializacja odbywa sie bezposrednio - przelaczenie watku kosztowaloby wiecej.
+        
+        Args:
+            messages: Lista slownikow do serializacji.
+        
+        Returns:
+            List[bytes]: Zserializowane wiadomosci w tej samej kolejnosci.
+        """
+        if len(self._queues) > SERIALIZE_OFFLOAD_CONNECTIONS:
+            return await asyncio.to_thread(lambda: [orjson.dumps(message) for message in messages])
+        return [orjson.dumps(message) for message in messages]
+
+    async def broadcast(self, message: Union[dict, bytes], droppable: bool = False) -> None:
+        """
+        Wysyla wiadomosc JSON do wszystkich aktywnych polaczen.
+        
+        Wiadomosc jest serializowana tylko raz (orjson) i dodawana do kolejki
+        kazdego polaczenia - wysylka odbywa sie w zadaniach piszacych, wiec
+        wolny klient nie wstrzymuje rozglaszania.
+        
+        Args:
+            message: Slownik do wyslania jako JSON lub gotowy, zserializowany JSON (bytes).
+            droppable: Czy wiadomosc moze zostac pominieta dla wolnego klienta (np. status).
+        """
+        payload = message if isinstance(message, bytes) else (await self._encode([message]))[0]
+        stuck = self._enqueue(payload, droppable)
+        if stuck:
+            await self._drop_stuck(stuck)
+
+    async def broadcast_many(self, messages: List[dict]) -> None:
+        """
+        Wysyla kilka wiadomosci do wszystkich klientow.
 
-manager = ConnectionManager()
+        Wiadomosci trafiaja do kolejek razem, wiec writer wysyla je
+        w jednej ramce (tablica JSON).
+
+        Args:
+            messages: Lista slownikow do wyslania.
+        """
+        stuck: Set[WebSocket] = set()
+        for payload in await self._encode(messages):
+            stuck.update(self._enqueue(payload))
+        if stuck:
+            await self._drop_stuck(list(stuck))
+
+
+@functools.lru_cache(maxsize=1)
+def get_manager() -> ConnectionManager:
+    """
+    Zwraca globalny menedzer polaczen WebSocket, tworzony przy pierwszym uzyciu.
+    
+    Returns:
+        ConnectionManager: Wspoldzielony menedzer polaczen.
+    """
+    return ConnectionManager()
 
 
 async def broadcast_server_status() -> None:
     """
     Zadanie w tle rozglaszajace status serwera co 5 sekund.
     
+    Kolejne ticki sa wyznaczane wzgledem zegara monotonicznego petli zdarzen
+    (next_tick += STATUS_INTERVAL_SECONDS), wiec czas wysylki nie przesuwa harmonogramu.
+    
     Ta funkcja dziala w nieskonczonosc i wysyla wiadomosc o statusie zawierajaca
     aktualny znacznik czasu, status serwera oraz liczbe podlaczonych klientow
     do wszystkich podlaczonych klientow WebSocket.
     
-    Wykorzystuje mechanizm blokad poprzez obiekt ServerStatus do bezpiecznego
-    odczytu wspoldzielonej zmiennej server_status.
+    Niezmieniony status (ten sam status i liczba klientow) nie jest wysylany
+    ponownie - tylko co STATUS_KEEPALIVE_SECONDS jako keepalive. Nowy klient
+    otrzymuje aktualny status od razu przy podlaczeniu (ConnectionManager.connect).
+    
+    Odczyt server_status jest synchroniczny (bez await), wiec zwraca spojny
+    stan wszystkich pol bez potrzeby blokady.
     """
+    manager = get_manager()
+    server_status = get_server_status()
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    last_key = None
+    last_sent = next_tick
     while True:
-        # Odswiezenie timestampa przed pobraniem statusu
-        await server_status.refresh_timestamp()
-        # Pobranie statusu z uzyciem blokady
-        status_message = await server_status.get_status()
-        await manager.broadcast(status_message)
-        await asyncio.sleep(5)
+        # Stala kadencja niezalezna od czasu wysylki (bez dryfu jak przy sleep(5) po pracy)
+        next_tick += STATUS_INTERVAL_SECONDS
+        status_message = server_status.get_status()
+        key = (status_message["status"], status_message["connected_clients"])
+        if key != last_key or loop.time() - last_sent > STATUS_KEEPALIVE_SECONDS:
+            # Znacznik czasu nadawany tylko przy faktycznej wysylce, bez zapisu do wspoldzielonego stanu
+            status_message["timestamp"] = datetime.now().isoformat()
+            await manager.broadcast(status_message, droppable=True)
+            last_key = key
+            last_sent = loop.time()
+
+        # Przy duzym opoznieniu harmonogram jest wyrownywany zamiast nadrabiac zalegle ticki seria
+        if loop.time() - next_tick > MAX_TICKS_BEHIND * STATUS_INTERVAL_SECONDS:
+            next_tick = loop.time()
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
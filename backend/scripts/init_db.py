@@ -0,0 +1,26 @@
+"""
+Jednorazowa inicjalizacja schematu bazy danych.
+
+Tworzy brakujace tabele na podstawie modeli SQLAlchemy. Przeznaczony do
+uruchomienia przed startem serwera (np. w kontenerze inicjalizujacym),
+zamiast tworzenia tabel przez kazdy proces workera przy starcie aplikacji.
+
+Uruchomienie (z katalogu backend):
+    python -m scripts.init_db
+"""
+import asyncio
+
+from app.database import engine, create_tables
+import app.models  # noqa: F401 - rejestracja modeli w Base.metadata
+
+
+async def main() -> None:
+    """
+    Tworzy tabele bazy danych i zamyka pule polaczen.
+    """
+    await create_tables()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,51 +3,38 @@ Testy importowania modulow aplikacji.
 
 Sprawdza czy wszystkie glowne moduly aplikacji moga byc poprawnie zaimportowane.
 """
+import importlib
+import pytest
 
 
-def test_import_app() -> None:
+@pytest.mark.parametrize("module_name, attrs", [
+    ("app.main", ["app"]),
+    ("app.models", ["Product", "Category"]),
+    ("app.schemas", ["ProductCreate", "ProductUpdate", "ProductResponse"]),
+    ("app.websockets", ["ConnectionManager", "get_manager", "get_server_status"]),
+])
+def test_import(module_name: str, attrs: list) -> None:
     """
-    Test importowania glownej aplikacji FastAPI.
-
-    Sprawdza czy modul app.main moze byc poprawnie zaimportowany
-    i czy instancja aplikacji jest dostepna.
-    """
-    from app.main import app
-    assert app is not None
-
-
-def test_import_models() -> None:
-    """
-    Test importowania modeli SQLAlchemy.
-
-    Sprawdza czy modul app.models moze byc poprawnie zaimportowany
-    i czy klasa Product jest dostepna.
-    """
-    from app.models import Product
-    assert Product is not None
+    Test importowania modulu aplikacji.
 
+    Sprawdza czy modul moze byc poprawnie zaimportowany
+    i czy wymienione obiekty (aplikacja, modele, schematy, menedzer WebSocket) sa dostepne.
 
-def test_import_schemas() -> None:
+    Args:
+        module_name: Nazwa importowanego modulu.
+        attrs: Nazwy obiektow, ktore modul musi udostepniac.
     """
-    Test importowania schematow Pydantic.
+    module = importlib.import_module(module_name)
+    for attr in attrs:
+        assert getattr(module, attr) is not None
 
-    Sprawdza czy modul app.schemas moze byc poprawnie zaimportowany
-    i czy wszystkie schematy sa dostepne.
-    """
-    from app.schemas import ProductCreate, ProductUpdate, ProductResponse
-    assert ProductCreate is not None
-    assert ProductUpdate is not None
-    assert ProductResponse is not None
 
-
-def test_import_websockets() -> None:
+def test_models_registered() -> None:
     """
-    Test importowania menedzera WebSocket.
+    Test rejestracji tabel modeli SQLAlchemy.
 
-    Sprawdza czy modul app.websockets moze byc poprawnie zaimportowany
-    i czy ConnectionManager jest dostepny.
+    Sprawdza czy tabele produktow i kategorii sa zarejestrowane w Base.metadata.
     """
-    from app.websockets import ConnectionManager, manager
-    assert ConnectionManager is not None
-    assert manager is not None
-
+    from app.database import Base
+    importlib.import_module("app.models")
+    assert {"products", "categories"} <= set(Base.metadata.tables)
@@ -1,11 +1,14 @@
 import pytest
 from httpx import AsyncClient, ASGITransport
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.pool import NullPool
-from app.main import app
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from app.main import app, PRODUCT_LOAD_OPTIONS, _category_ids
 from app.database import Base, get_db
-from app.websockets import manager
-from typing import AsyncGenerator
+from app.models import Product, Category
+from app.websockets import get_manager
+from app.cache import init_cache, invalidate_cache
+from typing import AsyncGenerator, Optional
 import os
 from dotenv import load_dotenv
 
@@ -17,12 +20,12 @@ DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+asyncpg://postgres:admin@lo
 TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", DATABASE_URL)
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 async def db_engine():
     """
-    Fixture tworzacy izolowany silnik bazy danych dla kazdego testu.
+    Fixture tworzacy silnik bazy danych i tabele raz na cala sesje testow.
     """
-    engine = create_async_engine(TEST_DATABASE_URL, poolclass=NullPool)
+    engine = create_async_engine(TEST_DATABASE_URL, pool_size=5, max_overflow=0)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     yield engine
@@ -34,11 +37,17 @@ async def db_engine():
 @pytest.fixture
 async def db_session(db_engine):
     """
-    Fixture tworzacy sesje bazy danych dla testu.
+    Fixture tworzacy sesje bazy danych dla testu w transakcji wycofywanej po tescie.
+
+    Commit wykonany w aplikacji zatwierdza jedynie punkt zapisu (SAVEPOINT),
+    wiec kazdy test zaczyna z pustymi tabelami.
     """
-    TestingSessionLocal = async_sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
-    async with TestingSessionLocal() as session:
+    async with db_engine.connect() as conn:
+        trans = await conn.begin()
+        session = AsyncSession(bind=conn, expire_on_commit=False, join_transaction_mode="create_savepoint")
         yield session
+        await session.close()
+        await trans.rollback()
 
 
 @pytest.fixture
@@ -53,28 +62,48 @@ def override_db(db_session):
     yield
     app.dependency_overrides.clear()
 
+
+@pytest.fixture(scope="session")
+async def client() -> AsyncGenerator[AsyncClient, None]:
+    """
+    Fixture udostepniajacy jednego klienta HTTP (ASGITransport) dla wszystkich testow.
+    """
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.fixture(autouse=True)
+async def caches():
+    """
+    Fixture inicjalizujacy cache odpowiedzi (lifespan nie jest uruchamiany w testach)
+    i czyszczacy po kazdym tescie cache odpowiedzi oraz cache ID kategorii.
+    """
+    init_cache()
+    yield
+    await invalidate_cache()
+    _category_ids.clear()
+
 @pytest.mark.asyncio
-async def test_create_product(override_db) -> None:
+async def test_create_product(override_db, client) -> None:
     """
     Test tworzenia nowego produktu przez endpoint POST /products/.
 
     Sprawdza czy produkt jest poprawnie tworzony i czy zwrocona odpowiedz
     zawiera wszystkie wymagane dane oraz przypisane ID.
     """
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
-        response = await ac.post("/products/", json={
-            "name": "Test Product",
-            "price": 10.5,
-            "quantity": 100,
-            "low_stock_threshold": 10
-        })
+    response = await client.post("/products/", json={
+        "name": "Test Product",
+        "price": 10.5,
+        "quantity": 100,
+        "low_stock_threshold": 10
+    })
     assert response.status_code == 200
     data = response.json()
     assert data["name"] == "Test Product"
     assert "id" in data
 
 @pytest.mark.asyncio
-async def test_update_product_triggers_alert(override_db) -> None:
+async def test_update_product_triggers_alert(override_db, client) -> None:
     """
     Test aktualizacji produktu i wyzwalania alertu niskiego stanu magazynowego.
 
@@ -83,114 +112,359 @@ async def test_update_product_triggers_alert(override_db) -> None:
     """
     from unittest.mock import AsyncMock, patch
     
-    with patch.object(manager, 'broadcast', new_callable=AsyncMock) as mock_broadcast:
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
-            # 1. Tworzenie Produktu
-            create_res = await ac.post("/products/", json={
-                "name": "Alert Product",
-                "price": 20.0,
-                "quantity": 10,
-                "low_stock_threshold": 5
-            })
-            product_id = create_res.json()["id"]
-
-            # 2. Aktualizacja produktu zeby wywolac alert (quantity 3 < threshold 5)
-            update_res = await ac.put(f"/products/{product_id}", json={
-                "quantity": 3
-            })
-            
-            assert update_res.status_code == 200
-            assert update_res.json()["quantity"] == 3
-            
-            # 3. Weryfikacja czy alert zostal wyslany przez WebSocket
-            alert_called = False
-            for call in mock_broadcast.call_args_list:
-                args = call[0][0]
-                if args.get("type") == "alert" and "Alert Product" in args.get("message", ""):
-                    alert_called = True
-                    break
-            
-            assert alert_called, "Alert broadcast was not sent"
+    manager = get_manager()
+    with patch.object(manager, 'broadcast', new_callable=AsyncMock), \
+            patch.object(manager, 'broadcast_many', new_callable=AsyncMock) as mock_broadcast_many:
+        # 1. Tworzenie Produktu
+        create_res = await client.post("/products/", json={
+            "name": "Alert Product",
+            "price": 20.0,
+            "quantity": 10,
+            "low_stock_threshold": 5
+        })
+        product_id = create_res.json()["id"]
+
+        # 2. Aktualizacja produktu zeby wywolac alert (quantity 3 < threshold 5)
+        update_res = await client.put(f"/products/{product_id}", json={
+            "quantity": 3
+        })
+
+        assert update_res.status_code == 200
+        assert update_res.json()["quantity"] == 3
+
+        # 3. Weryfikacja czy alert zostal wyslany przez WebSocket (w jednej ramce z aktualizacja)
+        alert_messages = [
+            message
+            for call in mock_broadcast_many.call_args_list
+            for message in call.args[0]
+            if message.get("type") == "alert"
+        ]
+        assert any("Alert Product" in message.get("message", "") for message in alert_messages), \
+            "Alert broadcast was not sent"
 
 @pytest.mark.asyncio
-async def test_read_products_list(override_db) -> None:
+async def test_read_products_list(override_db, client) -> None:
     """
     Test pobierania listy produktow przez endpoint GET /products/.
 
     Sprawdza czy endpoint poprawnie zwraca liste produktow
     oraz czy nowo utworzony produkt pojawia sie w tej liscie.
     """
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
-        await ac.post("/products/", json={
-            "name": "List Product",
-            "price": 10.0,
-            "quantity": 50,
-            "low_stock_threshold": 5
-        })
-        
-        response = await ac.get("/products/")
-        assert response.status_code == 200
-        data = response.json()
-        assert isinstance(data, list)
-        assert len(data) >= 1
-        names = [p["name"] for p in data]
-        assert "List Product" in names
+    await client.post("/products/", json={
+        "name": "List Product",
+        "price": 10.0,
+        "quantity": 50,
+        "low_stock_threshold": 5
+    })
+
+    response = await client.get("/products/")
+    assert response.status_code == 200
+    data = response.json()
+    assert isinstance(data, list)
+    assert len(data) >= 1
+    names = [p["name"] for p in data]
+    assert "List Product" in names
 
 @pytest.mark.asyncio
-async def test_read_single_product(override_db) -> None:
+async def test_read_single_product(override_db, client) -> None:
     """
     Test pobierania pojedynczego produktu przez endpoint GET /products/{id}.
 
     Sprawdza czy endpoint poprawnie zwraca dane konkretnego produktu
     na podstawie jego ID.
     """
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
-        create_res = await ac.post("/products/", json={
-            "name": "Single Product",
-            "price": 15.0,
-            "quantity": 20,
-            "low_stock_threshold": 5
-        })
-        product_id = create_res.json()["id"]
+    create_res = await client.post("/products/", json={
+        "name": "Single Product",
+        "price": 15.0,
+        "quantity": 20,
+        "low_stock_threshold": 5
+    })
+    product_id = create_res.json()["id"]
 
-        response = await ac.get(f"/products/{product_id}")
-        assert response.status_code == 200
-        data = response.json()
-        assert data["name"] == "Single Product"
-        assert data["id"] == product_id
+    response = await client.get(f"/products/{product_id}")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["name"] == "Single Product"
+    assert data["id"] == product_id
 
 @pytest.mark.asyncio
-async def test_read_product_not_found(override_db) -> None:
+async def test_read_product_not_found(override_db, client) -> None:
     """
     Test obslugi bledu 404 dla nieistniejacego produktu.
 
     Sprawdza czy endpoint zwraca kod 404 i odpowiedni komunikat
     gdy probujemy pobrac produkt o nieistniejacym ID.
     """
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
-        response = await ac.get("/products/999999")
-        assert response.status_code == 404
-        assert response.json()["detail"] == "Product not found"
+    response = await client.get("/products/999999")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Product not found"
 
 @pytest.mark.asyncio
-async def test_delete_product(override_db) -> None:
+async def test_delete_product(override_db, client) -> None:
     """
     Test usuwania produktu przez endpoint DELETE /products/{id}.
 
     Sprawdza czy produkt jest poprawnie usuwany i czy po usunieciu
     nie jest juz dostepny w systemie (zwraca 404).
     """
-    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
-        create_res = await ac.post("/products/", json={
-            "name": "To Delete",
-            "price": 5.0,
-            "quantity": 10,
-            "low_stock_threshold": 5
+    create_res = await client.post("/products/", json={
+        "name": "To Delete",
+        "price": 5.0,
+        "quantity": 10,
+        "low_stock_threshold": 5
+    })
+    product_id = create_res.json()["id"]
+
+    del_res = await client.delete(f"/products/{product_id}")
+    assert del_res.status_code == 200
+
+    get_res = await client.get(f"/products/{product_id}")
+    assert get_res.status_code == 404
+
+@pytest.mark.asyncio
+async def test_update_product_category(override_db, client) -> None:
+    """
+    Test zmiany kategorii produktu przez endpoint PUT /products/{id}.
+
+    Sprawdza czy po zmianie category_id odpowiedz zawiera dane
+    nowej kategorii, a nie kategorii przypisanej wczesniej.
+    """
+    first_res = await client.post("/categories/", json={"name": "First Category"})
+    second_res = await client.post("/categories/", json={"name": "Second Category"})
+    create_res = await client.post("/products/", json={
+        "name": "Category Product",
+        "price": 12.0,
+        "quantity": 30,
+        "low_stock_threshold": 5,
+        "category_id": first_res.json()["id"]
+    })
+    assert create_res.json()["category"]["name"] == "First Category"
+    product_id = create_res.json()["id"]
+
+    update_res = await client.put(f"/products/{product_id}", json={
+        "category_id": second_res.json()["id"]
+    })
+    assert update_res.status_code == 200
+    data = update_res.json()
+    assert data["category_id"] == second_res.json()["id"]
+    assert data["category"]["name"] == "Second Category"
+
+@pytest.mark.asyncio
+async def test_product_load_options_raise_on_lazy_load(db_session) -> None:
+    """
+    Test blokady niejawnego ladowania relacji (raiseload) dla zapytan o produkty.
+
+    Sprawdza czy kategoria produktu jest ladowana z wyprzedzeniem, a dostep
+    do relacji spoza zadeklarowanych opcji ladowania zglasza InvalidRequestError.
+    """
+    category = Category(name="Raise Category")
+    db_session.add(Product(name="Raise Product", price=1.0, quantity=1, category=category))
+    await db_session.commit()
+    db_session.expunge_all()
+
+    result = await db_session.execute(select(Product).options(*PRODUCT_LOAD_OPTIONS))
+    product = result.scalar_one()
+    assert product.category.name == "Raise Category"
+
+    with pytest.raises(InvalidRequestError):
+        product.category.products
+
+@pytest.mark.asyncio
+async def test_read_product_cache_invalidated_on_update(override_db, client) -> None:
+    """
+    Test cache odpowiedzi endpointu GET /products/{id}.
+
+    Sprawdza czy drugi odczyt jest obslugiwany z cache, czy przegladarka
+    musi rewalidowac odpowiedz (no-cache, ETag) oraz czy aktualizacja
+    produktu uniewaznia zapisana odpowiedz.
+    """
+    create_res = await client.post("/products/", json={
+        "name": "Cached Product",
+        "price": 8.0,
+        "quantity": 40,
+        "low_stock_threshold": 5
+    })
+    product_id = create_res.json()["id"]
+
+    first_res = await client.get(f"/products/{product_id}")
+    assert first_res.headers["X-FastAPI-Cache"] == "MISS"
+    second_res = await client.get(f"/products/{product_id}")
+    assert second_res.headers["X-FastAPI-Cache"] == "HIT"
+    assert second_res.json() == first_res.json()
+    assert first_res.headers["Cache-Control"] == second_res.headers["Cache-Control"] == "no-cache"
+
+    not_modified_res = await client.get(
+        f"/products/{product_id}", headers={"If-None-Match": second_res.headers["ETag"]}
+    )
+    assert not_modified_res.status_code == 304
+
+    await client.put(f"/products/{product_id}", json={"quantity": 35})
+
+    updated_res = await client.get(f"/products/{product_id}")
+    assert updated_res.headers["X-FastAPI-Cache"] == "MISS"
+    assert updated_res.json()["quantity"] == 35
+
+@pytest.mark.asyncio
+async def test_create_product_with_stale_category_cache(override_db, client) -> None:
+    """
+    Test walidacji kategorii przy nieaktualnym cache ID kategorii.
+
+    Sprawdza czy gdy cache wskazuje kategorie usunieta w innym procesie,
+    endpoint POST /products/ zwraca 404 (zamiast bledu bazy) i usuwa wpis z cache.
+    """
+    _category_ids[424242] = True
+    response = await client.post("/products/", json={
+        "name": "Stale Category Product",
+        "price": 3.0,
+        "quantity": 10,
+        "category_id": 424242
+    })
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Category not found"
+    assert 424242 not in _category_ids
+
+@pytest.mark.asyncio
+async def test_create_product_rejects_invalid_name(override_db, client) -> None:
+    """
+    Test walidacji nazwy produktu przez endpoint POST /products/.
+
+    Sprawdza czy zbyt dluga lub pusta (po usunieciu bialych znakow) nazwa
+    jest odrzucana z kodem 422 jeszcze przed zapisem do bazy.
+    """
+    too_long = await client.post("/products/", json={
+        "name": "x" * 256,
+        "price": 1.0,
+        "quantity": 1
+    })
+    blank = await client.post("/products/", json={
+        "name": "   ",
+        "price": 1.0,
+        "quantity": 1
+    })
+    assert too_long.status_code == 422
+    assert blank.status_code == 422
+
+@pytest.mark.asyncio
+async def test_read_products_with_legacy_rows(override_db, db_session, client) -> None:
+    """
+    Test odczytu wierszy niespelniajacych walidacji wejscia.
+
+    Sprawdza czy istniejace w bazie dane (pusta nazwa, opis dluzszy niz
+    TEXT_MAX_LENGTH) sa zwracane przez GET /products/ - ograniczenia dotycza
+    tylko schematow Create/Update, nie odpowiedzi.
+    """
+    db_session.add(Product(name="", description="x" * 2000, price=1.0, quantity=1))
+    await db_session.commit()
+
+    response = await client.get("/products/")
+    assert response.status_code == 200
+    [product] = response.json()
+    assert product["name"] == ""
+    assert len(product["description"]) == 2000
+
+@pytest.mark.asyncio
+async def test_write_succeeds_when_cache_clear_fails(override_db, client) -> None:
+    """
+    Test zapisu przy niedostepnym backendzie cache.
+
+    Sprawdza czy blad czyszczenia cache (np. niedostepny Redis) nie zamienia
+    zatwierdzonego zapisu w blad 500.
+    """
+    from unittest.mock import AsyncMock, patch
+    from fastapi_cache import FastAPICache
+
+    with patch.object(FastAPICache, "clear", AsyncMock(side_effect=ConnectionError("redis down"))):
+        response = await client.post("/products/", json={
+            "name": "No Cache Product",
+            "price": 2.0,
+            "quantity": 5
+        })
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_delete_category_unassigns_products(override_db, db_engine, client) -> None:
+    """
+    Test usuwania kategorii przez endpoint DELETE /categories/{id}.
+
+    Sprawdza czy produkty usunietej kategorii traca przypisanie (category_id = None),
+    czy usuniecie nie laduje produktow kategorii (brak SELECT na tabeli products)
+    oraz czy ponowne usuniecie zwraca 404.
+    """
+    from sqlalchemy import event
+
+    category_res = await client.post("/categories/", json={"name": "Deleted Category"})
+    category_id = category_res.json()["id"]
+    product_res = await client.post("/products/", json={
+        "name": "Orphan Product",
+        "price": 4.0,
+        "quantity": 10,
+        "category_id": category_id
+    })
+    product_id = product_res.json()["id"]
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        del_res = await client.delete(f"/categories/{category_id}")
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", record)
+    assert del_res.status_code == 200
+    assert not any(s.lstrip().upper().startswith("SELECT") and "products" in s for s in statements)
+
+    product = (await client.get(f"/products/{product_id}")).json()
+    assert product["category_id"] is None
+    assert product["category"] is None
+
+    missing_res = await client.delete(f"/categories/{category_id}")
+    assert missing_res.status_code == 404
+
+@pytest.mark.asyncio
+async def test_redis_cache_invalidated_by_generation(override_db, client, monkeypatch) -> None:
+    """
+    Test uniewazniania cache przez generacje (sciezka Redis).
+
+    Sprawdza czy przy Redis zapis zwieksza generacje cache (INCR) zamiast
+    czyscic klucze (skanowanie KEYS), a kolejny odczyt omija stary wpis.
+    """
+    from unittest.mock import AsyncMock, patch
+    from fastapi_cache import FastAPICache
+
+    class FakeRedis:
+        """
+        Atrapa klienta Redis obslugujaca tylko licznik generacji.
+        """
+        def __init__(self) -> None:
+            self.generation = 0
+
+        async def get(self, key: str) -> Optional[bytes]:
+            return str(self.generation).encode() if self.generation else None
+
+        async def incr(self, key: str) -> int:
+            self.generation += 1
+            return self.generation
+
+    fake_redis = FakeRedis()
+    monkeypatch.setattr("app.cache._redis", fake_redis)
+
+    with patch.object(FastAPICache, "clear", AsyncMock()) as mock_clear:
+        create_res = await client.post("/products/", json={
+            "name": "Generation Product",
+            "price": 6.0,
+            "quantity": 20
         })
         product_id = create_res.json()["id"]
 
-        del_res = await ac.delete(f"/products/{product_id}")
-        assert del_res.status_code == 200
+        assert (await client.get(f"/products/{product_id}")).headers["X-FastAPI-Cache"] == "MISS"
+        assert (await client.get(f"/products/{product_id}")).headers["X-FastAPI-Cache"] == "HIT"
+
+        await client.put(f"/products/{product_id}", json={"quantity": 15})
 
-        get_res = await ac.get(f"/products/{product_id}")
-        assert get_res.status_code == 404
+        updated_res = await client.get(f"/products/{product_id}")
+        assert updated_res.headers["X-FastAPI-Cache"] == "MISS"
+        assert updated_res.json()["quantity"] == 15
+        assert fake_redis.generation == 2
+        mock_clear.assert_not_awaited()
@@ -0,0 +1,227 @@
+"""
+Testy menedzera polaczen WebSocket.
+
+Polaczenia sa zastepowane atrapami (AsyncMock), wiec testy nie wymagaja bazy danych.
+"""
+import asyncio
+import orjson
+import pytest
+from types import SimpleNamespace
+from typing import List
+from unittest.mock import AsyncMock, MagicMock
+from starlette.websockets import WebSocketState
+from app.websockets import ConnectionManager, ServerStatus, broadcast_server_status, get_server_status
+
+
+def make_websocket(fail: bool = False) -> MagicMock:
+    """
+    Tworzy atrape polaczenia WebSocket.
+
+    Args:
+        fail: Czy wysylka do polaczenia ma konczyc sie bledem (rozlaczony klient).
+
+    Returns:
+        MagicMock: Atrapa polaczenia WebSocket.
+    """
+    websocket = MagicMock()
+    websocket.accept = AsyncMock()
+    websocket.application_state = WebSocketState.CONNECTED
+    websocket.send = AsyncMock(side_effect=RuntimeError("closed") if fail else None)
+    return websocket
+
+
+def sent_messages(websocket: MagicMock) -> List[dict]:
+    """
+    Zwraca wszystkie wiadomosci wyslane do atrapy polaczenia.
+
+    Ramki zawierajace tablice JSON sa rozwijane do pojedynczych wiadomosci.
+
+    Args:
+        websocket: Atrapa polaczenia WebSocket.
+
+    Returns:
+        List[dict]: Wyslane wiadomosci w kolejnosci wysylki.
+    """
+    messages: List[dict] = []
+    for call in websocket.send.await_args_list:
+        parsed = orjson.loads(call.args[0]["text"])
+        messages.extend(parsed if isinstance(parsed, list) else [parsed])
+    return messages
+
+
+@pytest.mark.asyncio
+async def test_broadcast_removes_dead_connections() -> None:
+    """
+    Test usuwania martwych polaczen podczas rozglaszania.
+
+    Sprawdza czy wiadomosc (po poczatkowym statusie) trafia do aktywnego klienta, a polaczenie,
+    do ktorego wysylka sie nie powiodla, jest usuwane z menedzera
+    i nie jest liczone ponownie przy kolejnym rozlaczeniu.
+    """
+    manager = ConnectionManager()
+    alive, dead = make_websocket(), make_websocket(fail=True)
+    clients_before = get_server_status()._connected_clients
+
+    await manager.connect(alive)
+    await manager.connect(dead)
+    await manager.broadcast({"type": "test"})
+    await asyncio.sleep(0.05)
+
+    assert [message["type"] for message in sent_messages(alive)] == ["status", "test"]
+    assert list(manager.active_connections) == [alive]
+    assert get_server_status()._connected_clients == clients_before + 1
+
+    await manager.disconnect(dead)
+    await manager.disconnect(alive)
+    assert get_server_status()._connected_clients == clients_before
+
+
+@pytest.mark.asyncio
+async def test_broadcast_batches_pending_messages() -> None:
+    """
+    Test laczenia oczekujacych wiadomosci w jedna ramke.
+
+    Sprawdza czy kilka wiadomosci rozgloszonych bez przerwy (razem
+    z poczatkowym statusem) trafia do klienta jako jedna tablica JSON.
+    """
+    manager = ConnectionManager()
+    websocket = make_websocket()
+
+    await manager.connect(websocket)
+    await manager.broadcast({"type": "a"})
+    await manager.broadcast_many([{"type": "b"}, {"type": "c"}])
+    await asyncio.sleep(0.05)
+
+    websocket.send.assert_awaited_once()
+    assert [message["type"] for message in sent_messages(websocket)] == ["status", "a", "b", "c"]
+    await manager.disconnect(websocket)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_bounds_slow_client_queue(monkeypatch) -> None:
+    """
+    Test ograniczenia kolejki wolnego klienta.
+
+    Sprawdza czy statusy sa pomijane dla zaleglego klienta, pozostale wiadomosci
+    trafiaja do kolejki az do limitu, a po jego przekroczeniu klient jest rozlaczany.
+    Zamkniecie zablokowanego polaczenia odbywa sie w tle i nie wstrzymuje rozglaszania.
+    """
+    async def hang(**kwargs) -> None:
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr("app.websockets.CLIENT_QUEUE_SIZE", 2)
+    monkeypatch.setattr("app.websockets.CLIENT_QUEUE_MAX_SIZE", 4)
+    monkeypatch.setattr("app.websockets.CLOSE_TIMEOUT", 0.05)
+    manager = ConnectionManager()
+    websocket = make_websocket()
+    websocket.close = AsyncMock(side_effect=hang)
+    clients_before = get_server_status()._connected_clients
+
+    await manager.connect(websocket)
+    queue = manager._queues[websocket]
+    for _ in range(3):
+        await manager.broadcast({"type": "status"}, droppable=True)
+    assert queue.qsize() == 2
+
+    await manager.broadcast_many([{"type": "product_updated"}, {"type": "alert"}])
+    assert queue.qsize() == 4
+    assert websocket in manager.active_connections
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await manager.broadcast({"type": "product_deleted"})
+    assert loop.time() - started < 0.05
+    assert websocket not in manager.active_connections
+    assert get_server_status()._connected_clients == clients_before
+
+    await asyncio.sleep(0.1)
+    websocket.close.assert_called_once_with(code=1013)
+    assert not manager._closing
+
+
+@pytest.mark.asyncio
+async def test_broadcast_serializes_in_thread_for_large_fanout(monkeypatch) -> None:
+    """
+    Test serializacji wiadomosci w puli watkow przy duzej liczbie klientow.
+
+    Sprawdza czy po przekroczeniu progu SERIALIZE_OFFLOAD_CONNECTIONS wiadomosc
+    jest serializowana przez asyncio.to_thread i nadal trafia do klienta.
+    """
+    monkeypatch.setattr("app.websockets.SERIALIZE_OFFLOAD_CONNECTIONS", 0)
+    to_thread = AsyncMock(side_effect=asyncio.to_thread)
+    monkeypatch.setattr("app.websockets.asyncio.to_thread", to_thread)
+    manager = ConnectionManager()
+    websocket = make_websocket()
+
+    await manager.connect(websocket)
+    await manager.broadcast({"type": "test"})
+    await asyncio.sleep(0.05)
+
+    to_thread.assert_awaited_once()
+    assert sent_messages(websocket)[-1] == {"type": "test"}
+    await manager.disconnect(websocket)
+
+
+@pytest.mark.asyncio
+async def test_connect_sends_current_status() -> None:
+    """
+    Test wysylki aktualnego statusu nowemu klientowi.
+
+    Sprawdza czy klient otrzymuje status zaraz po podlaczeniu, bez czekania
+    na rozgloszenie (ktore pomija niezmieniony status).
+    """
+    manager = ConnectionManager()
+    websocket = make_websocket()
+
+    await manager.connect(websocket)
+    await asyncio.sleep(0.05)
+
+    [status] = sent_messages(websocket)
+    assert status["type"] == "status"
+    assert status["connected_clients"] == get_server_status()._connected_clients
+    await manager.disconnect(websocket)
+
+
+class StopBroadcast(Exception):
+    """
+    Wyjatek zatrzymujacy nieskonczona petle rozglaszania statusu w tescie.
+    """
+
+
+@pytest.mark.asyncio
+async def test_broadcast_server_status_skips_unchanged_status(monkeypatch) -> None:
+    """
+    Test pomijania niezmienionego statusu przez zadanie rozglaszajace.
+
+    Petla dziala na sztucznym zegarze (podmienione asyncio.sleep i loop.time),
+    wiec test nie zalezy od rzeczywistego czasu. Sprawdza czy status jest wysylany
+    przy pierwszym ticku, po zmianie liczby klientow oraz po uplywie czasu
+    keepalive (30 s), a niezmieniony status jest pomijany.
+    """
+    now = [0.0]
+    sent = []
+    status = ServerStatus()
+
+    async def fake_sleep(delay: float) -> None:
+        now[0] += delay
+        if now[0] == 15.0:
+            status.on_client_delta(1)
+        if now[0] > 60.0:
+            raise StopBroadcast
+
+    manager = MagicMock()
+    manager.broadcast = AsyncMock(
+        side_effect=lambda message, **kwargs: sent.append((now[0], message["connected_clients"]))
+    )
+    fake_loop = SimpleNamespace(time=lambda: now[0])
+    monkeypatch.setattr(
+        "app.websockets.asyncio",
+        SimpleNamespace(get_running_loop=lambda: fake_loop, sleep=fake_sleep)
+    )
+    monkeypatch.setattr("app.websockets.get_manager", lambda: manager)
+    monkeypatch.setattr("app.websockets.get_server_status", lambda: status)
+
+    with pytest.raises(StopBroadcast):
+        await broadcast_server_status()
+
+    assert sent == [(0.0, 0), (15.0, 1), (50.0, 1)]
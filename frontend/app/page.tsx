@@ -94,47 +94,51 @@ export default function Home() {
       };
 
       ws.current.onmessage = (event) => {
-        const data = JSON.parse(event.data);
-
-        if (data.type === "status") {
-          setServerStatus({
-            timestamp: data.timestamp,
-            status: data.status,
-            connected_clients: data.connected_clients,
-          });
-        } else if (data.type === "alert") {
-          setAlert({
-            product: data.product,
-            message: data.message,
-          });
-          // Automatyczne ukrycie alertu po 10 sekundach
-          setTimeout(() => setAlert(null), 10000);
-        } else if (data.type === "product_created") {
-          setProducts((prev) => [...prev, data.product]);
-        } else if (data.type === "product_updated") {
-          setProducts((prev) =>
-            prev.map((p) => (p.id === data.product.id ? data.product : p))
-          );
-        } else if (data.type === "product_deleted") {
-          setProducts((prev) => prev.filter((p) => p.id !== data.product_id));
-        } else if (data.type === "category_created") {
-          setCategories((prev) => [...prev, data.category]);
-        } else if (data.type === "category_updated") {
-          setCategories((prev) =>
-            prev.map((c) => (c.id === data.category.id ? data.category : c))
-          );
-        } else if (data.type === "category_deleted") {
-          setCategories((prev) =>
-            prev.filter((c) => c.id !== data.category_id)
-          );
-          // Aktualizacja produktow - usuniecie przypisania kategorii
-          setProducts((prev) =>
-            prev.map((p) =>
-              p.category_id === data.category_id
-                ? { ...p, category_id: undefined, category: undefined }
-                : p
-            )
-          );
+        const parsed = JSON.parse(event.data);
+        // Serwer moze wyslac kilka wiadomosci w jednej ramce (tablica JSON)
+        const messages = Array.isArray(parsed) ? parsed : [parsed];
+
+        for (const data of messages) {
+          if (data.type === "status") {
+            setServerStatus({
+              timestamp: data.timestamp,
+              status: data.status,
+              connected_clients: data.connected_clients,
+            });
+          } else if (data.type === "alert") {
+            setAlert({
+              product: data.product,
+              message: data.message,
+            });
+            // Automatyczne ukrycie alertu po 10 sekundach
+            setTimeout(() => setAlert(null), 10000);
+          } else if (data.type === "product_created") {
+            setProducts((prev) => [...prev, data.product]);
+          } else if (data.type === "product_updated") {
+            setProducts((prev) =>
+              prev.map((p) => (p.id === data.product.id ? data.product : p))
+            );
+          } else if (data.type === "product_deleted") {
+            setProducts((prev) => prev.filter((p) => p.id !== data.product_id));
+          } else if (data.type === "category_created") {
+            setCategories((prev) => [...prev, data.category]);
+          } else if (data.type === "category_updated") {
+            setCategories((prev) =>
+              prev.map((c) => (c.id === data.category.id ? data.category : c))
+            );
+          } else if (data.type === "category_deleted") {
+            setCategories((prev) =>
+              prev.filter((c) => c.id !== data.category_id)
+            );
+            // Aktualizacja produktow - usuniecie przypisania kategorii
+            setProducts((prev) =>
+              prev.map((p) =>
+                p.category_id === data.category_id
+                  ? { ...p, category_id: undefined, category: undefined }
+                  : p
+              )
+            );
+          }
         }
       };
 